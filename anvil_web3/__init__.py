@@ -1,6 +1,8 @@
 """Wrapper and Web3 class to interact with and create Anvil chains"""
 from .wrapper import AnvilInstance
 from .anvil import AnvilWeb3, anvil
-from .types import AnvilConfig, Forking
+from .output import AnvilOutputReader
+from .subscriptions import AnvilSubscriber, Subscription
+from .types import AnvilConfig, AnvilLogRecord, Forking
 
 __version__ = "0.0.4"
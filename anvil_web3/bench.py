@@ -0,0 +1,272 @@
+"""Benchmark suite and regression check, run with `python -m anvil_web3.bench`"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Literal, Optional, TypedDict
+
+from web3 import HTTPProvider
+
+from . import __version__
+from .anvil import AnvilWeb3
+from .rpc import AnvilRPC, get_anvil_request_formatter, get_anvil_result_formatter
+from .wrapper import AnvilInstance
+
+# Whether a bigger number is an improvement or a regression
+Direction = Literal["lower", "higher"]
+
+
+class BenchResult(TypedDict):
+    unit: str
+    better: Direction
+    value: float
+    samples: int
+    # 90th percentile latency or 10th percentile throughput, the slowest tenth
+    worst_decile: float
+    min: float
+    max: float
+
+
+class BenchReport(TypedDict):
+    version: str
+    python: str
+    anvil: str
+    results: Dict[str, BenchResult]
+
+
+def _latency(samples: List[float]) -> BenchResult:
+    """Median of per-operation timings, in milliseconds"""
+    ms = [s * 1000 for s in samples]
+    worst = ms[0]
+    if len(ms) > 1:
+        worst = statistics.quantiles(ms, n=10, method="inclusive")[-1]
+    return {
+        "unit": "ms",
+        "better": "lower",
+        "value": statistics.median(ms),
+        "samples": len(ms),
+        "worst_decile": worst,
+        "min": min(ms),
+        "max": max(ms),
+    }
+
+
+def _throughput(operations: int, samples: List[float]) -> BenchResult:
+    """Median operations per second over repeated timed runs"""
+    rates = [operations / s for s in samples]
+    worst = rates[0]
+    if len(rates) > 1:
+        worst = statistics.quantiles(rates, n=10, method="inclusive")[0]
+    return {
+        "unit": "ops/s",
+        "better": "higher",
+        "value": statistics.median(rates),
+        "samples": len(rates),
+        "worst_decile": worst,
+        "min": min(rates),
+        "max": max(rates),
+    }
+
+
+def _time(fn: Callable[[], object], repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_spawn(repeat: int) -> BenchResult:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        instance = AnvilInstance()
+        samples.append(time.perf_counter() - start)
+        instance.kill()
+        instance.anvil_process.wait()
+    return _latency(samples)
+
+
+def bench_wait_until_live(repeat: int) -> BenchResult:
+    # Time from Popen returning until anvil answers, without the rest of
+    # AnvilInstance's setup, by polling through an instance that owns no process
+    probe = AnvilInstance.__new__(AnvilInstance)
+    probe.liveliness_timeout = 60
+    samples = []
+    for _ in range(repeat):
+        probe.config = {"host": "127.0.0.1", "port": AnvilInstance._find_free_port()}
+        process = subprocess.Popen(
+            ["anvil", "--port", probe.config["port"]],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            start = time.perf_counter()
+            probe._wait_until_live()
+            samples.append(time.perf_counter() - start)
+        finally:
+            process.terminate()
+            process.wait()
+    return _latency(samples)
+
+
+def bench_cheatcode(w3: AnvilWeb3, repeat: int) -> BenchResult:
+    account = w3.eth.account.from_key(w3.keccak(text="bench")).address
+    return _latency(_time(lambda: w3.anvil.set_balance(account, 42), repeat))
+
+
+def bench_raw_request(w3: AnvilWeb3, repeat: int) -> BenchResult:
+    # Same call as bench_cheatcode minus the Module/Method machinery
+    account = w3.eth.account.from_key(w3.keccak(text="bench")).address
+    return _latency(
+        _time(
+            lambda: w3.provider.make_request(
+                AnvilRPC.anvil_setBalance, [account, hex(42)]
+            ),
+            repeat,
+        )
+    )
+
+
+def bench_formatters(repeat: int) -> BenchResult:
+    account = "0x000000000000000000000000000000000000bEEF"
+
+    def format_batch() -> None:
+        # A single pass is far below timer resolution, so time batches of 1000
+        for _ in range(1000):
+            get_anvil_request_formatter(AnvilRPC.anvil_setStorageAt)(
+                [account, 1, b"\x01" * 32]
+            )
+            get_anvil_result_formatter(AnvilRPC.anvil_setStorageAt)(True)
+
+    return _latency([s / 1000 for s in _time(format_batch, repeat)])
+
+
+def bench_mining(w3: AnvilWeb3, blocks: int, repeat: int) -> BenchResult:
+    return _throughput(blocks, _time(lambda: w3.anvil.mine(blocks, None), repeat))
+
+
+def bench_seeding(w3: AnvilWeb3, accounts: int, repeat: int) -> BenchResult:
+    targets = [
+        w3.to_checksum_address((i + 1).to_bytes(20, "big")) for i in range(accounts)
+    ]
+
+    def seed() -> None:
+        for target in targets:
+            w3.anvil.set_balance(target, 10**18)
+            w3.anvil.set_storage_at(target, 0, b"\x01".rjust(32, b"\x00"))
+
+    return _throughput(accounts, _time(seed, repeat))
+
+
+def bench_fork_warmup(fork_url: str, repeat: int) -> BenchResult:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        instance = AnvilInstance(fork_url=fork_url)
+        w3 = AnvilWeb3(HTTPProvider(instance.http_url))
+        w3.eth.get_block("latest")
+        samples.append(time.perf_counter() - start)
+        instance.kill()
+        instance.anvil_process.wait()
+    return _latency(samples)
+
+
+def run(
+    *, repeat: int = 20, spawn_repeat: int = 5, fork_url: Optional[str] = None
+) -> BenchReport:
+    results: Dict[str, BenchResult] = {
+        "spawn": bench_spawn(spawn_repeat),
+        "wait_until_live": bench_wait_until_live(spawn_repeat),
+        "formatter_overhead": bench_formatters(repeat),
+    }
+
+    instance = AnvilInstance()
+    try:
+        w3 = AnvilWeb3(HTTPProvider(instance.http_url))
+        anvil_version = w3.client_version
+        results["cheatcode_round_trip"] = bench_cheatcode(w3, repeat)
+        results["raw_round_trip"] = bench_raw_request(w3, repeat)
+        results["mining_throughput"] = bench_mining(w3, 1000, repeat)
+        results["seeding_throughput"] = bench_seeding(w3, 100, max(1, repeat // 4))
+    finally:
+        instance.kill()
+
+    if fork_url is not None:
+        results["fork_warmup"] = bench_fork_warmup(fork_url, spawn_repeat)
+
+    return {
+        "version": __version__,
+        "python": platform.python_version(),
+        "anvil": anvil_version,
+        "results": results,
+    }
+
+
+def compare(report: BenchReport, baseline: BenchReport, tolerance: float) -> List[str]:
+    """Names and details of every metric that got worse than `tolerance` allows"""
+    regressions = []
+    for name, result in report["results"].items():
+        previous = baseline["results"].get(name)
+        if previous is None or previous["value"] == 0:
+            continue
+        change = (result["value"] - previous["value"]) / previous["value"]
+        if result["better"] == "higher":
+            change = -change
+        if change > tolerance:
+            regressions.append(
+                f"{name}: {previous['value']:.4g} -> {result['value']:.4g} "
+                f"{result['unit']} ({change:+.1%} worse)"
+            )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m anvil_web3.bench", description=__doc__
+    )
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--spawn-repeat", type=int, default=5)
+    parser.add_argument("--fork-url", help="also measure fork warm-up against this RPC")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="allowed relative slowdown per metric before failing (default 0.2)",
+    )
+    args = parser.parse_args(argv)
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+    if args.spawn_repeat < 1:
+        parser.error("--spawn-repeat must be at least 1")
+
+    report = run(
+        repeat=args.repeat, spawn_repeat=args.spawn_repeat, fork_url=args.fork_url
+    )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+"""Bulk state reads through helper contracts injected with anvil_setCode"""
+from typing import Any, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+from eth_typing import BlockIdentifier
+from eth_utils.address import to_canonical_address, to_checksum_address
+from hexbytes import HexBytes
+from web3 import Web3
+
+from .anvil import anvil as attach_anvil
+from .types import ValidAddress, ValidBytes
+
+T = TypeVar("T")
+
+# Reserved addresses the helpers are installed at, far away from anything a
+# deployer or precompile would occupy
+AGGREGATOR_ADDRESS = to_checksum_address("0x00000000000000000000000000000000a11ca11a")
+BALANCE_READER_ADDRESS = to_checksum_address(
+    "0x00000000000000000000000000000000ba1a9cea"
+)
+
+# Runtime code of the helpers. None of them use a selector: calldata is a
+# packed list of reads and the return data is a packed list of results.
+#
+# Aggregator, calldata is repeated [target: 20][length: 4][data: length] and the
+# output is repeated [success: 1][length: 4][returndata: length]:
+#
+#     PUSH1 0 PUSH1 0                                   ; [out, in]
+#   loop:
+#     JUMPDEST DUP1 CALLDATASIZE GT ISZERO PUSH1 end JUMPI
+#     DUP1 PUSH1 20 ADD CALLDATALOAD PUSH1 224 SHR      ; [out, in, len]
+#     DUP1 DUP3 PUSH1 24 ADD DUP5 PUSH1 5 ADD CALLDATACOPY
+#     PUSH1 0 PUSH1 0 DUP3 DUP6 PUSH1 5 ADD PUSH1 0
+#     DUP7 CALLDATALOAD PUSH1 96 SHR GAS CALL           ; [out, in, len, ok]
+#     PUSH1 248 SHL RETURNDATASIZE PUSH1 216 SHL OR DUP4 MSTORE
+#     RETURNDATASIZE PUSH1 0 DUP5 PUSH1 5 ADD RETURNDATACOPY
+#     ADD PUSH1 24 ADD SWAP1 RETURNDATASIZE ADD PUSH1 5 ADD SWAP1
+#     PUSH1 loop JUMP
+#   end:
+#     JUMPDEST POP PUSH1 0 RETURN
+AGGREGATOR_CODE = HexBytes(
+    "0x600060005b80361115605057806014013560e01c8082601801846005013760006000"
+    "82856005016000863560601c5af160f81b3d60d81b1783523d6000846005013e016018"
+    "01903d01600501906004565b506000f3"
+)
+
+# Balance reader, calldata is repeated [account: 20] and the output is one
+# 32 byte balance per account:
+#
+#     PUSH1 0 PUSH1 0                                   ; [out, in]
+#   loop:
+#     JUMPDEST DUP1 CALLDATASIZE GT ISZERO PUSH1 end JUMPI
+#     DUP1 CALLDATALOAD PUSH1 96 SHR BALANCE DUP3 MSTORE
+#     PUSH1 20 ADD SWAP1 PUSH1 32 ADD SWAP1 PUSH1 loop JUMP
+#   end:
+#     JUMPDEST POP PUSH1 0 RETURN
+BALANCE_READER_CODE = HexBytes(
+    "0x600060005b80361115601f57803560601c31825260140190602001906004565b506000f3"
+)
+
+# SLOAD batcher, calldata is repeated [slot: 32] and the output is one 32 byte
+# value per slot. SLOAD reads the storage of the executing account, so this one
+# is not installed anywhere: it is swapped in as the target's code through an
+# eth_call state override for the duration of the call.
+#
+#     PUSH1 0                                           ; [offset]
+#   loop:
+#     JUMPDEST DUP1 CALLDATASIZE GT ISZERO PUSH1 end JUMPI
+#     DUP1 CALLDATALOAD SLOAD DUP2 MSTORE PUSH1 32 ADD PUSH1 loop JUMP
+#   end:
+#     JUMPDEST PUSH1 0 RETURN
+SLOAD_BATCHER_CODE = HexBytes(
+    "0x60005b8036111560155780355481526020016002565b6000f3"
+)
+
+ERC20_BALANCE_OF = HexBytes("0x70a08231")
+ERC20_ALLOWANCE = HexBytes("0xdd62ed3e")
+
+# Blocks whose state already includes the installed helpers
+_HEAD_BLOCKS = ("latest", "pending")
+
+
+def _chunks(items: Sequence[T], size: int) -> Iterator[Sequence[T]]:
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def _pad_address(address: ValidAddress) -> bytes:
+    return to_canonical_address(address).rjust(32, b"\x00")
+
+
+def _words(data: bytes) -> List[int]:
+    return [int.from_bytes(data[i : i + 32], "big") for i in range(0, len(data), 32)]
+
+
+def _pack_calls(calls: Sequence[Tuple[ValidAddress, ValidBytes]]) -> bytes:
+    return b"".join(
+        to_canonical_address(target)
+        + len(HexBytes(data)).to_bytes(4, "big")
+        + HexBytes(data)
+        for target, data in calls
+    )
+
+
+def _unpack_results(output: bytes) -> List[Tuple[bool, HexBytes]]:
+    results: List[Tuple[bool, HexBytes]] = []
+    offset = 0
+    while offset < len(output):
+        length = int.from_bytes(output[offset + 1 : offset + 5], "big")
+        results.append(
+            (output[offset] == 1, HexBytes(output[offset + 5 : offset + 5 + length]))
+        )
+        offset += 5 + length
+    return results
+
+
+def _check_count(decoded: Sequence[Any], batch: Sequence[Any], helper: str) -> None:
+    # An empty account returns 0x, so a missing helper (e.g. after anvil_reset
+    # or evm_revert past the install) would otherwise yield a short list
+    if len(decoded) != len(batch):
+        raise ValueError(
+            f"{helper} returned {len(decoded)} results for {len(batch)} reads, "
+            "call install() again if the chain was reset or reverted"
+        )
+
+
+def _uint_or_none(result: Tuple[bool, HexBytes]) -> Optional[int]:
+    success, data = result
+    if not success or len(data) < 32:
+        return None
+    return int.from_bytes(data[:32], "big")
+
+
+class BulkReader:
+    """
+    Packs thousands of reads into a handful of eth_calls
+
+    `install` places the aggregator and balance reader at reserved addresses
+    with anvil_setCode, which works on forked and fresh chains alike. Reads are
+    split into batches of at most `batch_size` entries per eth_call.
+    """
+
+    def __init__(self, w3: Web3, *, batch_size: int = 500, install: bool = True):
+        if not hasattr(w3, "anvil"):
+            attach_anvil(w3)
+        self.w3 = w3
+        self.batch_size = batch_size
+        if install:
+            self.install()
+
+    def install(self) -> None:
+        for address, code in (
+            (AGGREGATOR_ADDRESS, AGGREGATOR_CODE),
+            (BALANCE_READER_ADDRESS, BALANCE_READER_CODE),
+        ):
+            if self.w3.eth.get_code(address) != code:
+                self.w3.anvil.set_code(address, code)  # type: ignore
+
+    def _call(
+        self,
+        to: ValidAddress,
+        code: HexBytes,
+        data: bytes,
+        block_identifier: Optional[BlockIdentifier],
+        override: bool = False,
+    ) -> HexBytes:
+        block = (
+            self.w3.eth.default_block if block_identifier is None else block_identifier
+        )
+        state_override = None
+        if override or block not in _HEAD_BLOCKS:
+            # Historical state predates the install, so bring the code along
+            state_override = {to: {"code": Web3.to_hex(code)}}
+        return self.w3.eth.call(
+            {"to": to, "data": HexBytes(data)},
+            block,
+            state_override,  # type: ignore
+        )
+
+    def call(
+        self,
+        calls: Sequence[Tuple[ValidAddress, ValidBytes]],
+        block_identifier: Optional[BlockIdentifier] = None,
+    ) -> List[Tuple[bool, HexBytes]]:
+        """Run (target, calldata) pairs, returning (success, returndata) for each"""
+        results: List[Tuple[bool, HexBytes]] = []
+        for batch in _chunks(calls, self.batch_size):
+            payload = _pack_calls(batch)
+            output = self._call(
+                AGGREGATOR_ADDRESS, AGGREGATOR_CODE, payload, block_identifier
+            )
+            decoded = _unpack_results(output)
+            _check_count(decoded, batch, "aggregator")
+            results.extend(decoded)
+        return results
+
+    def balances(
+        self,
+        accounts: Sequence[ValidAddress],
+        block_identifier: Optional[BlockIdentifier] = None,
+    ) -> List[int]:
+        """Ether balances of `accounts`"""
+        results: List[int] = []
+        for batch in _chunks(accounts, self.batch_size):
+            payload = b"".join(to_canonical_address(account) for account in batch)
+            balances = _words(
+                self._call(
+                    BALANCE_READER_ADDRESS,
+                    BALANCE_READER_CODE,
+                    payload,
+                    block_identifier,
+                )
+            )
+            _check_count(balances, batch, "balance reader")
+            results.extend(balances)
+        return results
+
+    def token_balances(
+        self,
+        token: ValidAddress,
+        holders: Sequence[ValidAddress],
+        block_identifier: Optional[BlockIdentifier] = None,
+    ) -> List[Optional[int]]:
+        """ERC20 `balanceOf` for each holder, None where the call failed"""
+        calls = [(token, ERC20_BALANCE_OF + _pad_address(holder)) for holder in holders]
+        return [_uint_or_none(result) for result in self.call(calls, block_identifier)]
+
+    def allowances(
+        self,
+        token: ValidAddress,
+        pairs: Sequence[Tuple[ValidAddress, ValidAddress]],
+        block_identifier: Optional[BlockIdentifier] = None,
+    ) -> List[Optional[int]]:
+        """ERC20 `allowance` for each (owner, spender) pair, None where the call failed"""
+        calls = [
+            (token, ERC20_ALLOWANCE + _pad_address(owner) + _pad_address(spender))
+            for owner, spender in pairs
+        ]
+        return [_uint_or_none(result) for result in self.call(calls, block_identifier)]
+
+    def storage_at(
+        self,
+        address: ValidAddress,
+        slots: Sequence[int],
+        block_identifier: Optional[BlockIdentifier] = None,
+    ) -> List[int]:
+        """Raw storage of `address` at each of `slots`"""
+        results: List[int] = []
+        for batch in _chunks(slots, self.batch_size):
+            payload = b"".join(slot.to_bytes(32, "big") for slot in batch)
+            values = _words(
+                self._call(
+                    to_checksum_address(address),
+                    SLOAD_BATCHER_CODE,
+                    payload,
+                    block_identifier,
+                    override=True,
+                )
+            )
+            _check_count(values, batch, "SLOAD batcher")
+            results.extend(values)
+        return results
@@ -0,0 +1,324 @@
+"""Signed transaction load generator for capacity-testing Anvil chains"""
+import itertools
+import math
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple, TypedDict
+
+import requests
+from eth_account import Account
+from eth_account.hdaccount import key_from_seed, seed_from_mnemonic
+
+from .wrapper import AnvilInstance
+
+# Anvil's own defaults, used when the instance config leaves them unset
+DEFAULT_MNEMONIC = "test test test test test test test test test test test junk"
+DEFAULT_DERIVATION_PATH = "m/44'/60'/0'/0/"
+DEFAULT_ACCOUNTS = 10
+
+TRANSFER_GAS = 21000
+
+# Full blocks raise the base fee by 12.5% each, so pre-signed transactions need
+# far more than the current price to stay includable for a long run
+DEFAULT_FEE_MULTIPLIER = 100
+MIN_GAS_PRICE = 10**9
+
+
+class LatencySummary(TypedDict):
+    p50: float
+    p90: float
+    p99: float
+    max: float
+
+
+class LoadReport(TypedDict):
+    sent: int
+    accepted: int
+    included: int
+    errors: int
+    submit_duration: float
+    duration: float
+    submit_tps: float
+    sustained_tps: float
+    submit_latency: LatencySummary
+    inclusion_latency: LatencySummary
+
+
+def derive_dev_keys(instance: AnvilInstance) -> List[bytes]:
+    """
+    Derive the private keys of the dev accounts anvil funds at startup, using
+    the mnemonic, derivation path and account count of the instance config
+    """
+    mnemonic = instance.config.get("mnemonic") or DEFAULT_MNEMONIC
+    derivation_path = instance.config.get("derivation_path") or DEFAULT_DERIVATION_PATH
+    accounts = instance.config.get("accounts")
+    if accounts is None:
+        accounts = DEFAULT_ACCOUNTS
+
+    # PBKDF2 over the mnemonic dominates derivation, so only do it once
+    seed = seed_from_mnemonic(mnemonic, "")
+    return [key_from_seed(seed, f"{derivation_path}{i}") for i in range(accounts)]
+
+
+def _sign_transfers(
+    private_key: bytes,
+    chain_id: int,
+    to: str,
+    first_nonce: int,
+    count: int,
+    gas_price: int,
+) -> List[str]:
+    # Runs inside the process pool, so only plain picklable values cross over
+    raw_txs = []
+    for nonce in range(first_nonce, first_nonce + count):
+        signed = Account.sign_transaction(
+            {
+                "chainId": chain_id,
+                "nonce": nonce,
+                "to": to,
+                "value": 1,
+                "gas": TRANSFER_GAS,
+                "gasPrice": gas_price,
+                "data": b"",
+            },
+            private_key,
+        )
+        raw_txs.append(signed.rawTransaction.hex())
+    return raw_txs
+
+
+def _summarize(samples: Sequence[float]) -> LatencySummary:
+    if not samples:
+        return {"p50": 0.0, "p90": 0.0, "p99": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+
+    def nearest_rank(pct: float) -> float:
+        index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+        return ordered[min(index, len(ordered) - 1)]
+
+    return {
+        "p50": nearest_rank(50),
+        "p90": nearest_rank(90),
+        "p99": nearest_rank(99),
+        "max": ordered[-1],
+    }
+
+
+class LoadGenerator:
+    """
+    Floods an AnvilInstance with signed value transfers from its dev accounts
+
+    Signing is done up front in a process pool, then the raw transactions are
+    pipelined as JSON-RPC batches over `connections` HTTP sessions. Inclusion is
+    tracked per block, mining blocks ourselves when the chain runs with
+    `no_mining` and waiting on anvil otherwise (automine or `block_time`).
+
+    Every transaction is signed with the same gas price, `fee_multiplier` times
+    the current one, because the base fee climbs while blocks are full. Once it
+    overtakes that price, later submissions are rejected and the remaining
+    nonces are stranded. For very long runs, raise `fee_multiplier`, pass an
+    explicit `gas_price`, or start anvil with a low `block_base_fee_per_gas`.
+    """
+
+    def __init__(
+        self,
+        instance: AnvilInstance,
+        *,
+        connections: int = 4,
+        pipeline_depth: int = 32,
+        signers: Optional[int] = None,
+        sign_chunk: int = 256,
+        gas_price: Optional[int] = None,
+        fee_multiplier: int = DEFAULT_FEE_MULTIPLIER,
+        mine_interval: float = 1.0,
+        poll_interval: float = 0.05,
+        drain_timeout: float = 60,
+    ):
+        self.instance = instance
+        self.connections = connections
+        self.pipeline_depth = pipeline_depth
+        self.signers = signers
+        self.sign_chunk = sign_chunk
+        self.gas_price = gas_price
+        self.fee_multiplier = fee_multiplier
+        self.mine_interval = mine_interval
+        self.poll_interval = poll_interval
+        self.drain_timeout = drain_timeout
+        self.keys = derive_dev_keys(instance)
+        self.addresses = [Account.from_key(key).address for key in self.keys]
+        self._session = requests.Session()
+        self._ids = itertools.count()
+
+    def _request(
+        self, method: str, params: list, session: Optional[requests.Session] = None
+    ) -> Any:
+        response = (session or self._session).post(
+            self.instance.http_url,
+            json={
+                "method": method,
+                "params": params,
+                "id": next(self._ids),
+                "jsonrpc": "2.0",
+            },
+        )
+        response.raise_for_status()
+        body = response.json()
+        if "error" in body:
+            raise ValueError(f"{method} failed: {body['error']}")
+        return body["result"]
+
+    def sign(self, txs_per_account: int) -> List[List[str]]:
+        """Sign `txs_per_account` transfers for every dev account, in nonce order"""
+        chain_id = int(self._request("eth_chainId", []), 16)
+        gas_price = self.gas_price
+        if gas_price is None:
+            current = int(self._request("eth_gasPrice", []), 16)
+            gas_price = max(current, MIN_GAS_PRICE) * self.fee_multiplier
+
+        jobs: List[Tuple[int, Tuple[Any, ...]]] = []
+        for index, (key, address) in enumerate(zip(self.keys, self.addresses)):
+            nonce = int(self._request("eth_getTransactionCount", [address, "pending"]), 16)
+            to = self.addresses[(index + 1) % len(self.addresses)]
+            for offset in range(0, txs_per_account, self.sign_chunk):
+                count = min(self.sign_chunk, txs_per_account - offset)
+                jobs.append((index, (key, chain_id, to, nonce + offset, count, gas_price)))
+
+        signed: List[List[str]] = [[] for _ in self.keys]
+        with ProcessPoolExecutor(max_workers=self.signers) as pool:
+            results = pool.map(_sign_transfers, *zip(*(args for _, args in jobs)))
+            for (index, _), raw_txs in zip(jobs, results):
+                signed[index].extend(raw_txs)
+        return signed
+
+    def run(self, txs_per_account: int) -> LoadReport:
+        """Sign, submit and wait for inclusion of `txs_per_account` transfers per account"""
+        signed = self.sign(txs_per_account)
+
+        # Each connection owns a disjoint set of accounts and interleaves them
+        # nonce by nonce, so no sender's nonces are ever split across sessions
+        lanes: List[List[str]] = []
+        for lane in range(self.connections):
+            owned = signed[lane :: self.connections]
+            lanes.append(
+                [raw for round_ in itertools.zip_longest(*owned) for raw in round_ if raw]
+            )
+
+        sent_at: Dict[str, float] = {}
+        submit_latency: List[float] = []
+        errors = 0
+        lock = threading.Lock()
+
+        def submit(raw_txs: List[str]) -> None:
+            nonlocal errors
+            session = requests.Session()
+            for start in range(0, len(raw_txs), self.pipeline_depth):
+                batch = raw_txs[start : start + self.pipeline_depth]
+                payload: List[Dict[str, Any]] = [
+                    {
+                        "method": "eth_sendRawTransaction",
+                        "params": [raw],
+                        "id": i,
+                        "jsonrpc": "2.0",
+                    }
+                    for i, raw in enumerate(batch)
+                ]
+                before = time.perf_counter()
+                try:
+                    response = session.post(self.instance.http_url, json=payload)
+                    response.raise_for_status()
+                    replies = response.json()
+                except (requests.RequestException, ValueError):
+                    with lock:
+                        errors += len(batch)
+                    continue
+                after = time.perf_counter()
+                if not isinstance(replies, list):
+                    # A single error object answers the whole batch
+                    with lock:
+                        errors += len(batch)
+                    continue
+                with lock:
+                    for reply in replies:
+                        if "result" in reply:
+                            sent_at[reply["result"]] = before
+                            submit_latency.append(after - before)
+                        else:
+                            errors += 1
+
+        included_at: Dict[str, float] = {}
+        submitting = threading.Event()
+        submitting.set()
+        start_block = int(self._request("eth_blockNumber", []), 16)
+        mine_manually = bool(self.instance.config.get("no_mining"))
+
+        def watch() -> None:
+            session = requests.Session()
+            next_block = start_block + 1
+            last_mine = time.perf_counter()
+            outstanding: Optional[set] = None
+            deadline = 0.0
+            while True:
+                now = time.perf_counter()
+                if not submitting.is_set():
+                    if outstanding is None:
+                        # Submission is over, so sent_at is final from here on
+                        with lock:
+                            outstanding = set(sent_at) - set(included_at)
+                        deadline = now + self.drain_timeout
+                    if not outstanding or now > deadline:
+                        return
+                if mine_manually and now - last_mine >= self.mine_interval:
+                    self._request("evm_mine", [], session)
+                    last_mine = now
+                head = int(self._request("eth_blockNumber", [], session), 16)
+                while next_block <= head:
+                    block = self._request(
+                        "eth_getBlockByNumber", [hex(next_block), False], session
+                    )
+                    seen = time.perf_counter()
+                    with lock:
+                        for tx_hash in block["transactions"]:
+                            included_at.setdefault(tx_hash, seen)
+                            if outstanding is not None:
+                                outstanding.discard(tx_hash)
+                    next_block += 1
+                time.sleep(self.poll_interval)
+
+        # Run the watcher as a future so its failures surface from run()
+        # instead of silently producing an empty inclusion report
+        with ThreadPoolExecutor(max_workers=1) as watchers:
+            watcher = watchers.submit(watch)
+            started = time.perf_counter()
+            try:
+                with ThreadPoolExecutor(max_workers=self.connections) as senders:
+                    list(senders.map(submit, lanes))
+            finally:
+                submit_duration = time.perf_counter() - started
+                submitting.clear()
+            watcher.result()
+
+        with lock:
+            inclusion_latency = [
+                included_at[tx_hash] - sent
+                for tx_hash, sent in sent_at.items()
+                if tx_hash in included_at
+            ]
+            last_inclusion = max(
+                (included_at[h] for h in sent_at if h in included_at), default=started
+            )
+            accepted = len(sent_at)
+
+        duration = max(last_inclusion, started + submit_duration) - started
+        return {
+            "sent": sum(len(lane) for lane in lanes),
+            "accepted": accepted,
+            "included": len(inclusion_latency),
+            "errors": errors,
+            "submit_duration": submit_duration,
+            "duration": duration,
+            "submit_tps": accepted / submit_duration if submit_duration else 0.0,
+            "sustained_tps": len(inclusion_latency) / duration if duration else 0.0,
+            "submit_latency": _summarize(submit_latency),
+            "inclusion_latency": _summarize(inclusion_latency),
+        }
@@ -0,0 +1,208 @@
+"""Background capture and parsing of anvil's stdout/stderr"""
+import re
+import threading
+import time
+from collections import deque
+from typing import IO, Callable, Deque, Iterator, List, Optional
+
+from .types import AnvilLogRecord
+
+TRANSACTION_RE = re.compile(r"^\s*Transaction:\s*(0x[0-9a-fA-F]+)")
+GAS_USED_RE = re.compile(r"^\s*Gas used:\s*(\d+)")
+CONTRACT_CREATED_RE = re.compile(r"^\s*Contract created:\s*(0x[0-9a-fA-F]+)")
+BLOCK_NUMBER_RE = re.compile(r"^\s*Block Number:\s*(\d+)")
+BLOCK_HASH_RE = re.compile(r"^\s*Block Hash:\s*(0x[0-9a-fA-F]+)")
+ERROR_RE = re.compile(r"\berror\b", re.IGNORECASE)
+
+
+class AnvilOutputReader:
+    """
+    Drains an anvil process' output pipe on a daemon thread into a bounded ring
+    buffer of structured records
+
+    The pipe is always read to the end so anvil never blocks on a full pipe;
+    once `max_records` is reached the oldest records are dropped (see `dropped`).
+    Callbacks run on a separate dispatcher thread with its own bounded backlog,
+    so a slow callback loses records (see `dropped_callbacks`) rather than
+    stalling anvil.
+    """
+
+    def __init__(
+        self,
+        stream: IO[str],
+        *,
+        max_records: int = 10_000,
+        callback: Optional[Callable[[AnvilLogRecord], None]] = None,
+    ):
+        self.stream = stream
+        self.records: Deque[AnvilLogRecord] = deque(maxlen=max_records)
+        self.dropped: int = 0
+        self.dropped_callbacks: int = 0
+        self.callbacks: List[Callable[[AnvilLogRecord], None]] = []
+        if callback is not None:
+            self.callbacks.append(callback)
+        self._condition = threading.Condition()
+        self._closed = False
+        self._callback_backlog: Deque[AnvilLogRecord] = deque(maxlen=max_records)
+        self._callback_condition = threading.Condition()
+        # Multi-line blocks printed by anvil, completed by a later line
+        self._pending_tx: Optional[AnvilLogRecord] = None
+        self._pending_block: Optional[AnvilLogRecord] = None
+        # Hash of the transaction whose block is being printed, anvil reports
+        # reverts on an `Error:` line after `Gas used:`
+        self._current_tx_hash: Optional[str] = None
+
+        self._thread = threading.Thread(
+            target=self._drain, name="anvil-output", daemon=True
+        )
+        self._dispatcher = threading.Thread(
+            target=self._dispatch, name="anvil-output-callbacks", daemon=True
+        )
+        self._thread.start()
+        self._dispatcher.start()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def add_callback(self, callback: Callable[[AnvilLogRecord], None]) -> None:
+        self.callbacks.append(callback)
+
+    def snapshot(self) -> List[AnvilLogRecord]:
+        """Copy of the currently buffered records, oldest first"""
+        with self._condition:
+            return list(self.records)
+
+    def drain(self) -> List[AnvilLogRecord]:
+        """Remove and return all buffered records, oldest first"""
+        with self._condition:
+            records = list(self.records)
+            self.records.clear()
+            return records
+
+    def follow(self, timeout: Optional[float] = None) -> Iterator[AnvilLogRecord]:
+        """
+        Consume records as they arrive, stopping once anvil's output closes or
+        no record shows up within `timeout` seconds
+        """
+        while True:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            with self._condition:
+                # Another consumer may take the record we were woken for, so
+                # keep waiting until the deadline rather than a single wakeup
+                while not self.records and not self._closed:
+                    remaining = None
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            return
+                    self._condition.wait(remaining)
+                if not self.records:
+                    return
+                record = self.records.popleft()
+            yield record
+
+    def __iter__(self) -> Iterator[AnvilLogRecord]:
+        return self.follow()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        """Wait for the output to close and every callback to be dispatched"""
+        self._thread.join(timeout)
+        self._dispatcher.join(timeout)
+
+    def _emit(self, record: AnvilLogRecord) -> None:
+        with self._condition:
+            if len(self.records) == self.records.maxlen:
+                self.dropped += 1
+            self.records.append(record)
+            self._condition.notify_all()
+        if self.callbacks:
+            with self._callback_condition:
+                if len(self._callback_backlog) == self._callback_backlog.maxlen:
+                    self.dropped_callbacks += 1
+                self._callback_backlog.append(record)
+                self._callback_condition.notify()
+
+    def _dispatch(self) -> None:
+        while True:
+            with self._callback_condition:
+                self._callback_condition.wait_for(
+                    lambda: self._callback_backlog or self._closed
+                )
+                if not self._callback_backlog:
+                    return
+                record = self._callback_backlog.popleft()
+            for callback in self.callbacks:
+                try:
+                    callback(record)
+                except Exception:
+                    # A failing consumer must not stop later records
+                    pass
+
+    def _parse(self, line: str) -> Optional[AnvilLogRecord]:
+        now = time.time()
+
+        match = TRANSACTION_RE.match(line)
+        if match:
+            self._pending_tx = {
+                "kind": "transaction",
+                "line": line,
+                "timestamp": now,
+                "tx_hash": match.group(1),
+                "gas_used": None,
+            }
+            self._current_tx_hash = match.group(1)
+            return None
+
+        match = GAS_USED_RE.match(line)
+        if match and self._pending_tx is not None:
+            record, self._pending_tx = self._pending_tx, None
+            record["gas_used"] = int(match.group(1))
+            return record
+
+        match = CONTRACT_CREATED_RE.match(line)
+        if match and self._pending_tx is not None:
+            self._pending_tx["contract_address"] = match.group(1)
+            return None
+
+        match = BLOCK_NUMBER_RE.match(line)
+        if match:
+            self._current_tx_hash = None
+            self._pending_block = {
+                "kind": "block",
+                "line": line,
+                "timestamp": now,
+                "block_number": int(match.group(1)),
+                "block_hash": None,
+            }
+            return None
+
+        match = BLOCK_HASH_RE.match(line)
+        if match and self._pending_block is not None:
+            record, self._pending_block = self._pending_block, None
+            record["block_hash"] = match.group(1)
+            return record
+
+        if ERROR_RE.search(line):
+            error: AnvilLogRecord = {"kind": "error", "line": line, "timestamp": now}
+            if self._current_tx_hash is not None:
+                error["tx_hash"] = self._current_tx_hash
+            return error
+
+        if not line.strip():
+            self._current_tx_hash = None
+            return None
+        return {"kind": "log", "line": line, "timestamp": now}
+
+    def _drain(self) -> None:
+        try:
+            for raw in self.stream:
+                record = self._parse(raw.rstrip("\n"))
+                if record is not None:
+                    self._emit(record)
+        finally:
+            with self._condition:
+                self._closed = True
+                self._condition.notify_all()
+            with self._callback_condition:
+                self._callback_condition.notify_all()
@@ -0,0 +1,388 @@
+"""Persistent WebSocket client delivering newHeads and logs subscriptions"""
+import asyncio
+import concurrent.futures
+import itertools
+import json
+import threading
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Coroutine,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from web3._utils.encoding import Web3JsonEncoder
+from web3._utils.method_formatters import (
+    block_formatter,
+    filter_params_formatter,
+    log_entry_formatter,
+)
+from web3.types import BlockData, FilterParams
+from websockets.client import connect
+from websockets.exceptions import ConnectionClosed
+
+T = TypeVar("T")
+
+# Default for mine_and_wait, which stalls while another subscription is full
+DEFAULT_MINE_TIMEOUT = 30.0
+
+NOTIFICATION_FORMATTERS: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+    "newHeads": block_formatter,
+    "logs": log_entry_formatter,
+}
+
+# Pushed into a queue when its subscription closes, to wake parked consumers
+_CLOSED: Dict[str, Any] = {}
+
+
+class Subscription:
+    """
+    Bounded queue of notifications for one eth_subscribe call
+
+    When the queue is full the client stops reading from the socket until it is
+    drained, so a slow consumer holds anvil back instead of growing memory.
+    Notifications already queued when the subscription is closed or
+    unsubscribed can still be consumed.
+    """
+
+    def __init__(
+        self,
+        client: "AnvilSubscriber",
+        kind: str,
+        max_queue: int,
+        enqueue: bool = True,
+    ):
+        self.client = client
+        self.kind = kind
+        self.id: Optional[str] = None
+        self.closed = False
+        # Waiter-only subscriptions never fill the queue, so they can't stall
+        # the reader
+        self.enqueue = enqueue
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(max_queue)
+        # Releases the reader if it is parked on a full queue
+        self._closing: "asyncio.Future[None]" = client._loop.create_future()
+        self.last_head: Optional[Dict[str, Any]] = None
+        # (block number, future) pairs resolved by the reader as heads arrive,
+        # independently of how far the queue has been consumed
+        self.head_waiters: List[Tuple[int, "asyncio.Future[Dict[str, Any]]"]] = []
+
+    async def _get(self, timeout: Optional[float]) -> Dict[str, Any]:
+        # Runs on the client loop, so a timeout can't race with the dequeue
+        if self.closed and self.queue.empty():
+            raise ConnectionError("WebSocket closed")
+        try:
+            notification = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"No notification within {timeout} seconds")
+        if notification is _CLOSED:
+            # Leave it for any other consumer parked on this queue
+            self.queue.put_nowait(_CLOSED)
+            raise ConnectionError("WebSocket closed")
+        return notification
+
+    async def _put(self, notification: Dict[str, Any]) -> None:
+        if self.closed:
+            return
+        if not self.queue.full():
+            self.queue.put_nowait(notification)
+            return
+        # Awaiting here is the backpressure: no more frames are read until the
+        # consumer makes room or the subscription goes away
+        put = asyncio.ensure_future(self.queue.put(notification))
+        await asyncio.wait([put, self._closing], return_when=asyncio.FIRST_COMPLETED)
+        put.cancel()
+
+    def _wait_head(self, target: int) -> "asyncio.Future[Dict[str, Any]]":
+        waiter: "asyncio.Future[Dict[str, Any]]" = self.client._loop.create_future()
+        if self.closed:
+            waiter.set_exception(ConnectionError("WebSocket closed"))
+        elif self.last_head is not None and int(self.last_head["number"], 16) >= target:
+            waiter.set_result(self.last_head)
+        else:
+            self.head_waiters.append((target, waiter))
+        return waiter
+
+    def _notify_head(self, head: Dict[str, Any]) -> None:
+        self.last_head = head
+        number = int(head["number"], 16)
+        waiting = []
+        for target, future in self.head_waiters:
+            if future.done():
+                continue
+            if number >= target:
+                future.set_result(head)
+            else:
+                waiting.append((target, future))
+        self.head_waiters = waiting
+
+    def _close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self._closing.set_result(None)
+        for _, future in self.head_waiters:
+            if not future.done():
+                future.set_exception(ConnectionError("WebSocket closed"))
+        self.head_waiters = []
+        # A full queue has no parked consumers, they find it closed once drained
+        if not self.queue.full():
+            self.queue.put_nowait(_CLOSED)
+
+    def get(self, timeout: Optional[float] = None) -> Any:
+        """
+        Block until the next notification, raising TimeoutError after `timeout`
+        and ConnectionError once the subscription is closed and the queue drained
+        """
+        if self.client._loop.is_closed():
+            raise ConnectionError("WebSocket closed")
+        notification = self.client._submit(self._get(timeout)).result()
+        return NOTIFICATION_FORMATTERS[self.kind](notification)
+
+    async def aget(self, timeout: Optional[float] = None) -> Any:
+        """Await the next notification from any event loop"""
+        if self.client._loop.is_closed():
+            raise ConnectionError("WebSocket closed")
+        notification = await asyncio.wrap_future(
+            self.client._submit(self._get(timeout))
+        )
+        return NOTIFICATION_FORMATTERS[self.kind](notification)
+
+    def __iter__(self) -> Iterator[Any]:
+        while True:
+            try:
+                yield self.get()
+            except ConnectionError:
+                return
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        while True:
+            try:
+                yield await self.aget()
+            except ConnectionError:
+                return
+
+    def unsubscribe(self) -> None:
+        """
+        Stop the subscription, consumers get the notifications already queued
+        and then ConnectionError
+        """
+        self.client._submit(self.client._unsubscribe(self)).result()
+
+
+class AnvilSubscriber:
+    """
+    Single WebSocket connection to an anvil node, run on a background event loop
+
+    Notifications are routed into per-subscription bounded queues which can be
+    consumed from plain threads (`Subscription.get`) or from any asyncio loop
+    (`Subscription.aget`).
+    """
+
+    def __init__(self, ws_url: str, *, max_queue: int = 1024):
+        self.ws_url = ws_url
+        self.max_queue = max_queue
+        self._ids = itertools.count()
+        self._pending: Dict[
+            int, Tuple["asyncio.Future[Any]", Optional[Subscription]]
+        ] = {}
+        self._subscriptions: Dict[str, Subscription] = {}
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="anvil-ws", daemon=True
+        )
+        self._thread.start()
+        self._ws: Any = self._submit(self._connect()).result()
+        self._reader = self._submit(self._read())
+
+    def _submit(
+        self, coro: Coroutine[Any, Any, T]
+    ) -> "concurrent.futures.Future[T]":
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    async def _connect(self) -> Any:
+        return await connect(self.ws_url, max_size=None)
+
+    async def _read(self) -> None:
+        try:
+            async for message in self._ws:
+                payload = json.loads(message)
+                if payload.get("method") == "eth_subscription":
+                    params = payload["params"]
+                    subscription = self._subscriptions.get(params["subscription"])
+                    if subscription is None:
+                        continue
+                    if subscription.kind == "newHeads":
+                        subscription._notify_head(params["result"])
+                    if subscription.enqueue:
+                        await subscription._put(params["result"])
+                    continue
+
+                pending = self._pending.pop(payload["id"], None)
+                if pending is None:
+                    # Reply to a request nobody waits for, see _unsubscribe
+                    continue
+                future, subscription = pending
+                if future.done():
+                    # The caller gave up waiting (timeout or cancellation)
+                    continue
+                if "error" in payload:
+                    future.set_exception(ValueError(payload["error"]))
+                    continue
+                if subscription is not None:
+                    # Register before resolving so no early notification is lost
+                    subscription.id = payload["result"]
+                    self._subscriptions[payload["result"]] = subscription
+                future.set_result(payload["result"])
+        finally:
+            for future, _ in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("WebSocket closed"))
+            self._pending.clear()
+            for subscription in self._subscriptions.values():
+                subscription._close()
+
+    def _encode(self, request_id: int, method: str, params: list) -> str:
+        return json.dumps(
+            {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params},
+            cls=Web3JsonEncoder,
+        )
+
+    async def _request(
+        self, method: str, params: list, subscription: Optional[Subscription] = None
+    ) -> Any:
+        request_id = next(self._ids)
+        message = self._encode(request_id, method, params)
+        future = self._loop.create_future()
+        self._pending[request_id] = (future, subscription)
+        await self._ws.send(message)
+        return await future
+
+    async def _subscribe(
+        self, kind: str, params: list, enqueue: bool = True
+    ) -> Subscription:
+        subscription = Subscription(self, kind, self.max_queue, enqueue)
+        await self._request("eth_subscribe", params, subscription)
+        return subscription
+
+    async def _unsubscribe(self, subscription: Subscription, wait: bool = True) -> None:
+        if subscription.id is None:
+            return
+        subscription_id, subscription.id = subscription.id, None
+        self._subscriptions.pop(subscription_id, None)
+        # Close first, the reader may be parked on this queue and would never
+        # read the eth_unsubscribe reply
+        subscription._close()
+        if wait:
+            await self._request("eth_unsubscribe", [subscription_id])
+            return
+        # The reader may be stalled behind another full queue, so don't wait
+        # for the reply
+        try:
+            await self._ws.send(
+                self._encode(next(self._ids), "eth_unsubscribe", [subscription_id])
+            )
+        except ConnectionClosed:
+            pass
+
+    def request(self, method: str, params: list) -> Any:
+        """Send a raw JSON-RPC request over the socket and wait for its result"""
+        return self._submit(self._request(method, params)).result()
+
+    def new_heads(self) -> Subscription:
+        return self._submit(self._subscribe("newHeads", ["newHeads"])).result()
+
+    def logs(self, filter_params: Optional[FilterParams] = None) -> Subscription:
+        params: list = ["logs"]
+        if filter_params is not None:
+            params.append(filter_params_formatter(filter_params))
+        return self._submit(self._subscribe("logs", params)).result()
+
+    async def _mine_and_wait(
+        self, num_blocks: int, subscription: Optional[Subscription]
+    ) -> BlockData:
+        own = subscription is None
+        if subscription is None:
+            subscription = await self._subscribe(
+                "newHeads", ["newHeads"], enqueue=False
+            )
+        waiter: Optional["asyncio.Future[Dict[str, Any]]"] = None
+        try:
+            await self._request("anvil_mine", [hex(num_blocks)])
+            # Read the height only once anvil_mine returned, so blocks mined by
+            # interval mining or other clients beforehand can't satisfy the wait
+            target = int(await self._request("eth_blockNumber", []), 16)
+            waiter = subscription._wait_head(target)
+            return block_formatter(await waiter)
+        finally:
+            if waiter is not None:
+                waiter.cancel()
+            if own:
+                await self._unsubscribe(subscription, wait=False)
+
+    def mine_and_wait(
+        self,
+        num_blocks: int = 1,
+        *,
+        subscription: Optional[Subscription] = None,
+        timeout: Optional[float] = DEFAULT_MINE_TIMEOUT,
+    ) -> BlockData:
+        """
+        Mine `num_blocks` with anvil_mine and return the first head at or above
+        the chain height once anvil_mine returned, as seen on `subscription` (a
+        temporary newHeads subscription by default)
+
+        That head includes the mined blocks, but is a later one if something
+        else mined concurrently. It is tracked as it is read off the socket, not
+        taken from the subscription's queue. Other subscriptions on this
+        connection must still be consumed while waiting: a full queue stalls
+        every frame behind it, and TimeoutError is raised after `timeout`.
+        """
+        return self._submit(
+            self._wait_for(self._mine_and_wait(num_blocks, subscription), timeout)
+        ).result()
+
+    async def _wait_for(
+        self, coro: Coroutine[Any, Any, T], timeout: Optional[float]
+    ) -> T:
+        try:
+            return await asyncio.wait_for(coro, timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Timed out after {timeout} seconds")
+
+    async def amine_and_wait(
+        self,
+        num_blocks: int = 1,
+        *,
+        subscription: Optional[Subscription] = None,
+        timeout: Optional[float] = DEFAULT_MINE_TIMEOUT,
+    ) -> BlockData:
+        return await asyncio.wrap_future(
+            self._submit(
+                self._wait_for(self._mine_and_wait(num_blocks, subscription), timeout)
+            )
+        )
+
+    async def _shutdown(self) -> None:
+        # Release a reader parked on a full queue so it sees the socket close
+        for subscription in self._subscriptions.values():
+            subscription._close()
+        await self._ws.close()
+
+    def close(self) -> None:
+        if self._loop.is_closed():
+            return
+        self._submit(self._shutdown()).result()
+        # Let the reader finish so pending requests and waiters get failed
+        concurrent.futures.wait([self._reader], timeout=5)
+        self._reader.cancel()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
@@ -1,4 +1,4 @@
-from typing import Optional, TypedDict, Union
+from typing import Literal, Optional, TypedDict, Union
 from eth_typing import (
     Address,
     BlockNumber,
@@ -78,3 +78,14 @@ class AnvilConfigInstance(AnvilConfigBase):
 class Forking(TypedDict, total=False):
     json_rpc_url: Optional[str]
     block_number: Optional[int]
+
+
+class AnvilLogRecord(TypedDict, total=False):
+    kind: Literal["transaction", "block", "error", "log"]
+    line: str
+    timestamp: float
+    tx_hash: Optional[str]
+    gas_used: Optional[int]
+    contract_address: Optional[str]
+    block_number: Optional[int]
+    block_hash: Optional[str]
@@ -1,10 +1,12 @@
-from typing import Union, Dict, Callable
+from typing import Any, Union, Dict, Callable, Optional
 import sys
 import atexit
 from typing_extensions import Unpack
 import subprocess
 import socket
-from .types import AnvilConfig, AnvilConfigInstance
+from .types import AnvilConfig, AnvilConfigInstance, AnvilLogRecord
+from .output import AnvilOutputReader
+from .subscriptions import AnvilSubscriber
 import time
 import requests
 import signal
@@ -19,6 +21,9 @@ class AnvilInstance:
         self,
         *,
         supress_anvil_output: bool = True,
+        capture_anvil_output: bool = False,
+        output_buffer_size: int = 10_000,
+        on_anvil_output: Optional[Callable[[AnvilLogRecord], None]] = None,
         liveliness_timeout: int = 60,
         **config: Unpack[AnvilConfig],
     ):
@@ -29,6 +34,7 @@ class AnvilInstance:
             "port": lambda: AnvilInstance._find_free_port(),
         }
         self.liveliness_timeout: int
+        self.subscribers: list[AnvilSubscriber] = []
         # Auto-exiting state
         self.parent_pid: int
 
@@ -48,11 +54,30 @@ class AnvilInstance:
                     self.cli_config.extend([f"--{fmt_key}", str(value)])
         self.liveliness_timeout = liveliness_timeout
 
-        self.anvil_process = subprocess.Popen(
-            ["anvil"] + self.cli_config,
-            stdout=subprocess.DEVNULL if supress_anvil_output else None,
-            stderr=subprocess.DEVNULL if supress_anvil_output else None,
-        )
+        self.output: Optional[AnvilOutputReader] = None
+        # Text mode when capturing, bytes (or no pipes at all) otherwise
+        self.anvil_process: "subprocess.Popen[Any]"
+        if capture_anvil_output:
+            self.anvil_process = subprocess.Popen(
+                ["anvil"] + self.cli_config,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                errors="replace",
+                bufsize=1,
+            )
+            assert self.anvil_process.stdout is not None
+            self.output = AnvilOutputReader(
+                self.anvil_process.stdout,
+                max_records=output_buffer_size,
+                callback=on_anvil_output,
+            )
+        else:
+            self.anvil_process = subprocess.Popen(
+                ["anvil"] + self.cli_config,
+                stdout=subprocess.DEVNULL if supress_anvil_output else None,
+                stderr=subprocess.DEVNULL if supress_anvil_output else None,
+            )
 
         def exit_handler():
             self.anvil_process.terminate()
@@ -78,7 +103,16 @@ class AnvilInstance:
     def ws_url(self):
         return f"ws://{self.url}"
 
+    def subscriber(self, *, max_queue: int = 1024) -> AnvilSubscriber:
+        """Open a WebSocket connection for newHeads/logs subscriptions"""
+        subscriber = AnvilSubscriber(self.ws_url, max_queue=max_queue)
+        self.subscribers.append(subscriber)
+        return subscriber
+
     def kill(self):
+        for subscriber in self.subscribers:
+            subscriber.close()
+        self.subscribers.clear()
         self.anvil_process.terminate()
 
     @staticmethod
@@ -0,0 +1,14 @@
+# Capacity-test a local chain with signed transfers from the dev accounts
+from anvil_web3 import AnvilInstance
+from anvil_web3.loadgen import LoadGenerator
+
+if __name__ == "__main__":
+    anvil_instance = AnvilInstance(accounts=20, block_time=1)
+
+    report = LoadGenerator(anvil_instance, connections=4).run(txs_per_account=500)
+
+    print("Sustained TPS", report["sustained_tps"])
+    print("Submit latency", report["submit_latency"])
+    print("Inclusion latency", report["inclusion_latency"])
+
+    anvil_instance.kill()
@@ -0,0 +1,168 @@
+from typing import Any, Dict, List, Optional
+
+import pytest
+from eth_utils.address import to_canonical_address
+from hexbytes import HexBytes
+
+from anvil_web3 import bulk
+from anvil_web3.bulk import BulkReader
+
+# The helpers are hand-assembled, so run them on a real EVM
+base = pytest.importorskip("eth.chains.base")
+from eth.db.atomic import AtomicDB  # noqa: E402
+from eth.vm.forks import ShanghaiVM  # noqa: E402
+from eth.vm.message import Message  # noqa: E402
+from eth.vm.transaction_context import BaseTransactionContext  # noqa: E402
+
+SENDER = b"\x01" * 20
+TARGET = b"\x77" * 20
+# Returns its calldata, reverts when it is empty
+ECHO_CODE = bytes.fromhex("3615600f57366000600037366000f35b600080fd")
+
+
+def address(n: int) -> bytes:
+    return n.to_bytes(20, "big")
+
+
+class FakeEth:
+    """eth.call served by py-evm, honouring code state overrides"""
+
+    def __init__(self) -> None:
+        chain = base.MiningChain.configure(
+            vm_configuration=((0, ShanghaiVM),)
+        ).from_genesis(
+            AtomicDB(), {"difficulty": 0, "gas_limit": 30_000_000, "timestamp": 0}
+        )
+        self.state = chain.get_vm().state
+        self.default_block: Any = "latest"
+        self.calls: List[Dict[str, Any]] = []
+
+    def get_code(self, account: str) -> HexBytes:
+        return HexBytes(self.state.get_code(to_canonical_address(account)))
+
+    def call(
+        self, tx: Dict[str, Any], block: Any, override: Optional[dict]
+    ) -> HexBytes:
+        self.calls.append({"block": block, "override": override})
+        to = to_canonical_address(tx["to"])
+        original = self.state.get_code(to)
+        if override is not None:
+            self.state.set_code(to, bytes(HexBytes(override[tx["to"]]["code"])))
+        try:
+            message = Message(
+                gas=10_000_000,
+                to=to,
+                sender=SENDER,
+                value=0,
+                data=bytes(tx["data"]),
+                code=self.state.get_code(to),
+            )
+            computation = self.state.computation_class.apply_message(
+                self.state, message, BaseTransactionContext(0, SENDER)
+            )
+            if computation.is_error:
+                raise computation.error
+            return HexBytes(computation.output)
+        finally:
+            self.state.set_code(to, original)
+
+
+class FakeAnvil:
+    def __init__(self, eth: FakeEth):
+        self.eth = eth
+
+    def set_code(self, account: str, code: HexBytes) -> None:
+        self.eth.state.set_code(to_canonical_address(account), bytes(code))
+
+
+class FakeWeb3:
+    def __init__(self) -> None:
+        self.eth = FakeEth()
+        self.anvil = FakeAnvil(self.eth)
+
+
+@pytest.fixture
+def w3() -> FakeWeb3:
+    w3 = FakeWeb3()
+    w3.eth.state.set_code(TARGET, ECHO_CODE)
+    return w3
+
+
+def test_pack_unpack_round_trip():
+    calls = [(TARGET, b"hello"), (TARGET, b""), (address(12), "0x6263")]
+    packed = bulk._pack_calls(calls)
+    assert packed == b"".join(
+        [
+            TARGET + b"\x00\x00\x00\x05hello",
+            TARGET + b"\x00\x00\x00\x00",
+            address(12) + b"\x00\x00\x00\x02bc",
+        ]
+    )
+    output = b"\x01\x00\x00\x00\x02ok" + b"\x00\x00\x00\x00\x00"
+    assert bulk._unpack_results(output) == [(True, b"ok"), (False, b"")]
+
+
+def test_aggregator(w3):
+    reader = BulkReader(w3, batch_size=2)  # type: ignore
+    results = reader.call(
+        [
+            (TARGET, b"a"),
+            (TARGET, "0x6263"),
+            (TARGET, b""),
+            (address(99), b""),
+            (TARGET, bytes(range(70))),
+        ]
+    )
+    assert results == [
+        (True, b"a"),
+        (True, b"bc"),
+        (False, b""),
+        (True, b""),
+        (True, bytes(range(70))),
+    ]
+    # Three batches, all served by the installed code
+    assert [call["override"] for call in w3.eth.calls] == [None] * 3
+
+
+def test_balances(w3):
+    w3.eth.state.set_balance(address(9), 10**18)
+    w3.eth.state.set_balance(address(10), 5)
+    reader = BulkReader(w3, batch_size=2)  # type: ignore
+    assert reader.balances([address(9), address(10), address(11)]) == [10**18, 5, 0]
+
+
+def test_token_balances_decode_failures_as_none(w3):
+    reader = BulkReader(w3)  # type: ignore
+    # The echo target returns the 36 byte calldata, whose first word is the
+    # selector and the start of the holder address
+    (balance,) = reader.token_balances(TARGET, [address(5)])
+    assert balance == int.from_bytes(
+        (bulk.ERC20_BALANCE_OF + address(5).rjust(32, b"\x00"))[:32], "big"
+    )
+    assert reader.token_balances(address(99), [address(5)]) == [None]
+
+
+def test_storage_at_leaves_target_code_untouched(w3):
+    w3.eth.state.set_storage(TARGET, 3, 42)
+    w3.eth.state.set_storage(TARGET, 2**200, 99)
+    reader = BulkReader(w3, batch_size=2)  # type: ignore
+    assert reader.storage_at(TARGET, [3, 4, 2**200]) == [42, 0, 99]
+    assert w3.eth.state.get_code(TARGET) == ECHO_CODE
+
+
+def test_missing_helper_raises(w3):
+    reader = BulkReader(w3, install=False)  # type: ignore
+    with pytest.raises(ValueError, match="install"):
+        reader.balances([address(9)])
+
+
+def test_default_block_is_honoured(w3):
+    reader = BulkReader(w3)  # type: ignore
+    w3.eth.default_block = 0
+    reader.balances([address(9)])
+    w3.eth.default_block = "pending"
+    reader.balances([address(9)])
+    assert [call["block"] for call in w3.eth.calls] == [0, "pending"]
+    # The helper predates block 0, so its code has to be overridden
+    assert w3.eth.calls[0]["override"] is not None
+    assert w3.eth.calls[1]["override"] is None
@@ -0,0 +1,124 @@
+import io
+import os
+import threading
+import time
+
+from anvil_web3.output import AnvilOutputReader
+
+
+def read_all(text: str, **kwargs) -> AnvilOutputReader:
+    reader = AnvilOutputReader(io.StringIO(text), **kwargs)
+    reader.join()
+    return reader
+
+
+def test_transaction_with_gas_used():
+    reader = read_all(
+        "eth_sendRawTransaction\n"
+        "\n"
+        "    Transaction: 0xabc\n"
+        "    Gas used: 21000\n"
+        "\n"
+    )
+    records = reader.drain()
+    assert records[0]["kind"] == "log"
+    assert records[1]["kind"] == "transaction"
+    assert records[1]["tx_hash"] == "0xabc"
+    assert records[1]["gas_used"] == 21000
+    assert len(records) == 2
+
+
+def test_contract_created():
+    reader = read_all(
+        "    Transaction: 0xabc\n"
+        "    Contract created: 0x5fbdb2315678afecb367f032d93f642f64180aa3\n"
+        "    Gas used: 123456\n"
+    )
+    (record,) = reader.drain()
+    assert record["kind"] == "transaction"
+    assert record["contract_address"] == "0x5fbdb2315678afecb367f032d93f642f64180aa3"
+    assert record["gas_used"] == 123456
+
+
+def test_block_mined():
+    reader = read_all(
+        "    Block Number: 7\n"
+        "    Block Hash: 0xdef\n"
+        '    Block Time: "Mon, 19 Oct 2026 00:00:00 +0000"\n'
+    )
+    block, block_time = reader.drain()
+    assert block["kind"] == "block"
+    assert block["block_number"] == 7
+    assert block["block_hash"] == "0xdef"
+    assert block_time["kind"] == "log"
+
+
+def test_revert_error_is_linked_to_transaction():
+    reader = read_all(
+        "    Transaction: 0xabc\n"
+        "    Gas used: 30000\n"
+        "    Error: reverted with: nope\n"
+        "\n"
+        "    Block Number: 1\n"
+        "    Block Hash: 0xdef\n"
+        "\n"
+        "Error: unrelated\n"
+    )
+    tx, revert, block, unrelated = reader.drain()
+    assert tx["kind"] == "transaction"
+    assert revert["kind"] == "error"
+    assert revert["tx_hash"] == "0xabc"
+    assert block["kind"] == "block"
+    assert unrelated["kind"] == "error"
+    assert "tx_hash" not in unrelated
+
+
+def test_ring_buffer_drops_oldest():
+    reader = read_all("".join(f"line {i}\n" for i in range(5)), max_records=2)
+    assert reader.dropped == 3
+    assert [r["line"] for r in reader.drain()] == ["line 3", "line 4"]
+
+
+def test_slow_callback_does_not_block_draining():
+    release = threading.Event()
+    seen = []
+
+    def callback(record):
+        release.wait(5)
+        seen.append(record["line"])
+
+    reader = AnvilOutputReader(
+        io.StringIO("".join(f"line {i}\n" for i in range(100))), callback=callback
+    )
+    reader._thread.join(5)
+    assert reader.closed
+    assert len(reader.snapshot()) == 100
+    release.set()
+    reader.join(5)
+    assert len(seen) == 100
+
+
+def test_follow_waits_until_timeout_when_record_is_taken():
+    read_fd, write_fd = os.pipe()
+    sink = open(write_fd, "w", buffering=1)
+    reader = AnvilOutputReader(open(read_fd))
+    results = {}
+
+    def consume(name):
+        start = time.monotonic()
+        results[name] = (list(reader.follow(timeout=1)), time.monotonic() - start)
+
+    consumers = [threading.Thread(target=consume, args=(n,)) for n in "ab"]
+    for consumer in consumers:
+        consumer.start()
+    time.sleep(0.1)
+    sink.write("only line\n")
+    for consumer in consumers:
+        consumer.join(5)
+    sink.close()
+    reader.join(5)
+
+    records = results["a"][0] + results["b"][0]
+    assert [r["line"] for r in records] == ["only line"]
+    # Neither consumer gave up before its timeout elapsed
+    assert min(elapsed for _, elapsed in results.values()) >= 1
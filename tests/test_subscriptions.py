@@ -0,0 +1,158 @@
+import asyncio
+import json
+import threading
+import time
+from typing import Any, Dict, Iterator, List
+
+import pytest
+import websockets
+
+from anvil_web3.subscriptions import AnvilSubscriber
+
+
+class FakeNode:
+    """Just enough of anvil's WebSocket API: newHeads, anvil_mine, eth_blockNumber"""
+
+    def __init__(self) -> None:
+        self.block = 0
+        self.subscriptions: Dict[str, str] = {}
+        self.requests: List[Dict[str, Any]] = []
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        async def serve() -> None:
+            async with websockets.serve(self.handle, "127.0.0.1", 0) as server:
+                self.port = server.sockets[0].getsockname()[1]
+                started.set()
+                await asyncio.Future()
+
+        threading.Thread(
+            target=self.loop.run_until_complete, args=(serve(),), daemon=True
+        ).start()
+        started.wait()
+
+    async def handle(self, ws: Any) -> None:
+        async for message in ws:
+            request = json.loads(message)
+            self.requests.append(request)
+            method, params = request["method"], request["params"]
+            result: Any = None
+            if method == "eth_subscribe":
+                result = hex(len(self.requests))
+                self.subscriptions[result] = params[0]
+            elif method == "eth_unsubscribe":
+                result = self.subscriptions.pop(params[0], None) is not None
+            elif method == "eth_blockNumber":
+                result = hex(self.block)
+            elif method == "anvil_mine":
+                for _ in range(int(params[0], 16)):
+                    await self.mine(ws)
+            reply = {"jsonrpc": "2.0", "id": request["id"], "result": result}
+            await ws.send(json.dumps(reply))
+
+    async def mine(self, ws: Any) -> None:
+        self.block += 1
+        head = {
+            "number": hex(self.block),
+            "hash": "0x" + "11" * 32,
+            "parentHash": "0x" + "22" * 32,
+            "timestamp": "0x5",
+        }
+        for subscription, kind in list(self.subscriptions.items()):
+            if kind == "newHeads":
+                notification = {"subscription": subscription, "result": head}
+                await ws.send(
+                    json.dumps(
+                        {
+                            "jsonrpc": "2.0",
+                            "method": "eth_subscription",
+                            "params": notification,
+                        }
+                    )
+                )
+
+
+@pytest.fixture
+def node() -> FakeNode:
+    return FakeNode()
+
+
+@pytest.fixture
+def subscriber(node: FakeNode) -> Iterator[AnvilSubscriber]:
+    subscriber = AnvilSubscriber(f"ws://127.0.0.1:{node.port}", max_queue=4)
+    yield subscriber
+    subscriber.close()
+
+
+def test_mine_and_wait_past_queue_size(subscriber):
+    assert subscriber.mine_and_wait(10)["number"] == 10
+
+
+def test_mine_and_wait_ignores_earlier_blocks(node, subscriber):
+    subscriber.mine_and_wait(1)
+    # Blocks mined by someone else before the call
+    node.block += 5
+    assert subscriber.mine_and_wait(1)["number"] == 7
+
+
+def test_mine_and_wait_times_out_behind_full_queue(subscriber):
+    subscriber.new_heads()
+    with pytest.raises(TimeoutError):
+        subscriber.mine_and_wait(10, timeout=0.5)
+
+
+def test_logs_filter_params_are_formatted(node, subscriber):
+    subscriber.logs({"fromBlock": 5, "toBlock": "latest"})
+    assert node.requests[-1]["params"] == [
+        "logs",
+        {"fromBlock": "0x5", "toBlock": "latest"},
+    ]
+
+
+def test_unserializable_params_leave_nothing_pending(subscriber):
+    with pytest.raises(TypeError):
+        subscriber.request("eth_call", [object()])
+    assert subscriber._pending == {}
+
+
+def test_unsubscribe_keeps_queued_and_releases_reader(subscriber):
+    heads = subscriber.new_heads()
+    # Six heads into a queue of four parks the reader before the reply
+    miner = threading.Thread(target=subscriber.request, args=("anvil_mine", ["0x6"]))
+    miner.start()
+    time.sleep(0.3)
+    assert miner.is_alive()
+
+    heads.unsubscribe()
+    miner.join(2)
+    assert not miner.is_alive()
+    assert [head["number"] for head in heads] == [1, 2, 3, 4]
+    with pytest.raises(ConnectionError):
+        heads.get(0.1)
+
+
+def test_unsubscribe_wakes_parked_consumer(subscriber):
+    heads = subscriber.new_heads()
+    errors: List[Exception] = []
+
+    def consume() -> None:
+        try:
+            heads.get()
+        except ConnectionError as e:
+            errors.append(e)
+
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+    time.sleep(0.2)
+    heads.unsubscribe()
+    consumer.join(2)
+    assert len(errors) == 1
+
+
+def test_close_does_not_wait_on_stalled_reader(subscriber):
+    subscriber.new_heads()
+    with pytest.raises(TimeoutError):
+        subscriber.mine_and_wait(10, timeout=0.2)
+    start = time.monotonic()
+    subscriber.close()
+    assert time.monotonic() - start < 1